@@ -1,14 +1,171 @@
+import csv
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import re
 import polars as pl
 import duckdb
 from pathlib import Path
 import pyarrow.dataset as ds
 import pyarrow as pa
+import shutil
+import tempfile
+import threading
+import time
 import zipfile
 from datetime import datetime
 from polars import selectors as cs  
 import pyarrow.parquet as pq
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+from contextlib import closing, contextmanager
+from functools import partial
+
+from typing import Callable, Dict, Literal
+
+from libs.manifest import PARTITION_SCHEMA, update_manifest
+
+logger = logging.getLogger(__name__)
+
+# ZIP から展開する際のコピー用バッファサイズ
+_COPY_BUFSIZE = 1 << 20
+
+# 出力 Parquet の書込設定（zstd レベル1 + 辞書エンコード、大きめのページ）
+# ページインデックスも書き込み、読込側がページ単位で範囲外を読み飛ばせるようにする
+_PARQUET_FORMAT = ds.ParquetFileFormat()
+_PARQUET_WRITE_OPTIONS = _PARQUET_FORMAT.make_write_options(
+    compression="zstd",
+    compression_level=1,
+    use_dictionary=True,
+    write_statistics=True,
+    write_page_index=True,
+    data_page_size=1 << 20,
+    write_batch_size=64_000,
+)
+# 行グループあたりの行数（最終グループ以外はこの行数にそろえる）とファイルあたりの最大行数
+_ROWS_PER_GROUP = 256_000
+_MAX_ROWS_PER_FILE = 4_000_000
+
+# precision 引数と数値列の出力型の対応
+_FLOAT_DTYPES = {"f32": pl.Float32, "f64": pl.Float64}
+
+# 出力 Parquet のスキーマメタデータに PI のヘッダー情報を保存するキー
+_PI_HEADER_KEY = b"pi_header"
+_HEADER_SCHEMA = {"param_id": pl.String, "param_name": pl.String, "unit": pl.String}
+
+
+def _extract_member(
+    zf: zipfile.ZipFile, lock: threading.Lock, info: zipfile.ZipInfo, target: Path
+) -> Path:
+    """Copy the member ``info`` of ``zf`` to ``target`` with a large buffer.
+
+    The extracted file gets the member's timestamp, so an unchanged member
+    keeps the same modification time across runs. Extraction is skipped
+    when ``target`` already has the member's size and timestamp.
+
+    ``zf`` is shared between threads. ``ZipFile.open`` and closing a member
+    update the archive's reference count without its own lock, so both are
+    done while holding ``lock``; reading the member is not serialized.
+    """
+    mtime = time.mktime(info.date_time + (0, 0, -1))
+    try:
+        st = target.stat()
+        if st.st_size == info.file_size and st.st_mtime == mtime:
+            return target
+    except FileNotFoundError:
+        pass
+    with lock:
+        src = zf.open(info)
+    try:
+        with open(target, "wb") as dst:
+            shutil.copyfileobj(src, dst, _COPY_BUFSIZE)
+    finally:
+        with lock:
+            src.close()
+    os.utime(target, (mtime, mtime))
+    return target
+
+
+def _extract_zip_csvs(zip_path: Path) -> list[Path]:
+    """Extract the CSV members of ``zip_path`` and return their paths.
+
+    Members are written under ``__extracted_csvs__/<zip name>`` next to the
+    archive. Extraction runs in a thread pool because decompression and file
+    writes release the GIL. Members with absolute paths or ``..`` are
+    skipped with a warning, and invalid archives yield an empty list.
+    """
+    extracted_dir = zip_path.parent / "__extracted_csvs__" / zip_path.stem
+    try:
+        with zipfile.ZipFile(zip_path) as zf:
+            # 中央ディレクトリは一度だけ読み、ZipInfo をそのまま展開に使う
+            members = []
+            for info in zf.infolist():
+                member_path = Path(info.filename)
+                # skip suspicious paths
+                if member_path.is_absolute() or ".." in member_path.parts:
+                    logger.warning("skip invalid path %s in %s", info.filename, zip_path)
+                    continue
+                if info.is_dir() or not member_path.name.lower().endswith(".csv"):
+                    continue
+                members.append(info)
+            if not members:
+                return []
+
+            # 出力先ディレクトリは事前にまとめて作成する
+            targets = [extracted_dir / m.filename for m in members]
+            for d in {t.parent for t in targets}:
+                d.mkdir(parents=True, exist_ok=True)
+
+            workers = min(32, (os.cpu_count() or 1) * 2, len(members))
+            extract = partial(_extract_member, zf, threading.Lock())
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                return list(pool.map(extract, members, targets))
+    except zipfile.BadZipFile:
+        # skip files that are not valid zip archives
+        return []
+
+
+def _scan_csv_and_zip(target_path: Path) -> tuple[list[Path], list[Path]]:
+    """Walk ``target_path`` once and return its CSV and ZIP files.
+
+    ``os.scandir`` is used so that the file type comes from the directory
+    entry without an extra ``stat`` per file. Subdirectories that cannot be
+    read are skipped, as ``Path.rglob`` does.
+    """
+    csv_files: list[Path] = []
+    zip_files: list[Path] = []
+    stack = [os.fspath(target_path)]
+    while stack:
+        try:
+            it = os.scandir(stack.pop())
+        except PermissionError:
+            # 権限のないフォルダ（System Volume Information など）は読み飛ばす
+            continue
+        with it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                    continue
+                suffix = os.path.splitext(entry.name)[1].lower()
+                if suffix == ".csv" and entry.is_file():
+                    csv_files.append(Path(entry.path))
+                elif suffix == ".zip" and entry.is_file():
+                    zip_files.append(Path(entry.path))
+    return csv_files, zip_files
+
+
+def _compile_name_pattern(file_name_pattern: list[str] | None) -> re.Pattern | None:
+    """Compile ``file_name_pattern`` into one regex matching any of them.
+
+    Each pattern is matched as a plain substring of the file name, so a
+    name is tested in a single pass instead of once per pattern. ``None``
+    is returned when there is nothing to filter.
+    """
+    if not file_name_pattern:
+        return None
+    return re.compile("|".join(map(re.escape, file_name_pattern)))
 
-from typing import Callable, Dict
 
 def search_csv_file(
     target_path: Path, file_name_pattern: list[str] | None = None
@@ -25,40 +182,24 @@ def search_csv_file(
         returned.
     """
 
-    csv_files = list(target_path.rglob("*.csv"))
+    # CSV と ZIP は一度の走査でまとめて探す
+    csv_files, zip_files = _scan_csv_and_zip(target_path)
 
     # search for zipped CSV files
-    for zip_path in target_path.rglob("*.zip"):
-        try:
-            with zipfile.ZipFile(zip_path) as zf:
-                for member in zf.namelist():
-                    member_path = Path(member)
-                    # skip suspicious paths
-                    if member_path.is_absolute() or ".." in member_path.parts:
-                        print(f"warning: skip invalid path {member} in {zip_path}")
-                        continue
-                    if not member_path.name.lower().endswith(".csv"):
-                        continue
-                    extracted_dir = zip_path.parent / "__extracted_csvs__" / zip_path.stem
-                    extracted_dir.mkdir(parents=True, exist_ok=True)
-                    zf.extract(member, path=extracted_dir)
-                    csv_files.append(extracted_dir / member_path)
-        except zipfile.BadZipFile:
-            # skip files that are not valid zip archives
-            continue
+    for zip_path in zip_files:
+        csv_files.extend(_extract_zip_csvs(zip_path))
+    # 展開済みの CSV はディレクトリ走査でも見つかるため重複を除く
+    csv_files = list(dict.fromkeys(csv_files))
 
     if not csv_files:
-        print(f"No CSV files found in {target_path}")
+        logger.info("No CSV files found in %s", target_path)
         return []
 
-    if not file_name_pattern:
+    pattern = _compile_name_pattern(file_name_pattern)
+    if pattern is None:
         return csv_files
 
-    matched_files = []
-    for csv_file in csv_files:
-        if any(pat in csv_file.name for pat in file_name_pattern):
-            matched_files.append(csv_file)
-    return matched_files
+    return [csv_file for csv_file in csv_files if pattern.search(csv_file.name)]
 
 
 def collect_csv_files(
@@ -66,11 +207,15 @@ def collect_csv_files(
 ) -> list[Path]:
     """Collect CSV files from directories or paths.
 
-    Each path in ``targets`` may be a directory, a CSV file or a ZIP archive.
-    ZIP archives are extracted under a ``__extracted_csvs__`` directory.
+    Each path in ``targets`` may be a directory, a CSV file, a ZIP archive or
+    a Parquet file. ZIP archives are extracted under a ``__extracted_csvs__``
+    directory. Parquet files are only taken when given explicitly, so that
+    an output dataset below a searched directory is not read back in. A file
+    reachable from several targets is returned only once.
     """
 
     collected: list[Path] = []
+    pattern = _compile_name_pattern(file_name_pattern)
 
     for t in targets:
         if t.is_dir():
@@ -79,30 +224,20 @@ def collect_csv_files(
 
         if t.is_file():
             suffix = t.suffix.lower()
-            if suffix == ".csv":
-                if not file_name_pattern or any(p in t.name for p in file_name_pattern):
+            if suffix in (".csv", ".parquet"):
+                if pattern is None or pattern.search(t.name):
                     collected.append(t)
                 continue
             if suffix == ".zip":
-                try:
-                    with zipfile.ZipFile(t) as zf:
-                        for member in zf.namelist():
-                            mp = Path(member)
-                            if mp.is_absolute() or ".." in mp.parts:
-                                print(f"warning: skip invalid path {member} in {t}")
-                                continue
-                            if not mp.name.lower().endswith(".csv"):
-                                continue
-                            extract_dir = t.parent / "__extracted_csvs__" / t.stem
-                            extract_dir.mkdir(parents=True, exist_ok=True)
-                            zf.extract(member, path=extract_dir)
-                            fp = extract_dir / mp
-                            if not file_name_pattern or any(p in fp.name for p in file_name_pattern):
-                                collected.append(fp)
-                except zipfile.BadZipFile:
-                    continue
+                for fp in _extract_zip_csvs(t):
+                    if pattern is None or pattern.search(fp.name):
+                        collected.append(fp)
 
-    return collected
+    # 同じファイルが複数のターゲットに含まれる場合は最初のパスだけを残す
+    unique: dict[Path, Path] = {}
+    for fp in collected:
+        unique.setdefault(fp.resolve(), fp)
+    return list(unique.values())
 
 
 
@@ -121,30 +256,40 @@ def read_pi_file(file_path: Path, encoding="utf-8"):
     tuple[pl.LazyFrame, pl.LazyFrame]
         ``(lf, header_lf)`` where ``lf`` contains the sensor data and
         ``header_lf`` stores parameter id, name and unit information.
+        Rows whose timestamp cannot be parsed have a null ``Datetime``;
+        :func:`write_parquet_file` reports and drops them.
     """
     # ── 1. ヘッダー読み込み（3行） ─────────────────────
-    with open(file_path, encoding=encoding) as f:
-        header = [next(f) for _ in range(3)]
-    
     # 各行をカンマ区切りで分割 → [[ID1, ID2, ...], [name1, name2, ...], [unit1, unit2, ...]]
-    header = [row.strip().split(",") for row in header]
+    # 引用符で囲まれた値も正しく扱えるよう csv モジュールで解析する
+    with open(file_path, encoding=encoding, newline="") as f:
+        reader = csv.reader(f)
+        header = [next(reader) for _ in range(3)]
 
     # 先頭列名を"Datetime"に変更
     param_ids = header[0]
     param_ids[0] = "Datetime"  # 元々の1列目は日時情報
 
     # ── 2. センサデータ本体のLazyFrame化 ───────────────
+    # 型はヘッダーから決まるため推定のための全件走査は行わない。
+    # センサ値は Float64 として読み、数値でない値（"Bad" など）は null とする
+    dtypes = {pid: pl.Float64 for pid in param_ids[1:]}
+    dtypes["Datetime"] = pl.String
     lf = pl.scan_csv(
         file_path,
         has_header=False,
         new_columns=param_ids,
         skip_rows=3,
-        try_parse_dates=True,
-        infer_schema_length=None,
+        schema_overrides=dtypes,
+        infer_schema_length=0,
+        ignore_errors=True,
+    )
+    # 空行の除去（日時の欄が空の行。末尾の ",,," など）
+    lf = lf.filter(pl.col("Datetime").is_not_null())
+    # 形式が合わない日時は null になる。そのような行は書込時に件数を報告して除外する
+    lf = lf.with_columns(
+        pl.col("Datetime").str.to_datetime(time_unit="us", strict=False)
     )
-
-    # null行の除去
-    lf = lf.filter(pl.any_horizontal(pl.all().is_not_null()))
 
     # パーティショニング用列追加
     lf = lf.with_columns([
@@ -153,14 +298,66 @@ def read_pi_file(file_path: Path, encoding="utf-8"):
     ])
 
     # ── 3. ヘッダー情報の縦持ちLazyFrame構築 ──────────
-    # 1列目は "Datetime" なので除外
-    ids, names, units = header[0][1:], header[1][1:], header[2][1:]
-    header_records = list(zip(ids, names, units))
-
+    # 1列目は "Datetime" なので除外し、3行の長さが異なる場合は短い方にそろえる
+    # 行ごとのタプルを作らず、各行のリストをそのまま列として渡す
+    n = min(len(row) for row in header)
     header_lf = pl.LazyFrame(
-        header_records,
-        schema=["param_id", "param_name", "unit"],
-        orient="row",
+        {
+            "param_id": header[0][1:n],
+            "param_name": header[1][1:n],
+            "unit": header[2][1:n],
+        },
+        schema=_HEADER_SCHEMA,
+    )
+
+    return lf, header_lf
+
+
+def read_pi_parquet(file_path: Path, encoding="utf-8"):
+    """Read a Parquet file with PI data and return data and header LazyFrames.
+
+    The file is scanned directly, skipping CSV parsing. Files written by
+    :func:`write_parquet_file` carry the PI header in their ``pi_header``
+    schema metadata; for other files the column names are used as parameter
+    ids and names.
+
+    Parameters
+    ----------
+    file_path : Path
+        Parquet file with a ``Datetime`` column and one column per parameter.
+    encoding : str, optional
+        Unused. Accepted for compatibility with :data:`READERS`.
+
+    Returns
+    -------
+    tuple[pl.LazyFrame, pl.LazyFrame]
+        ``(lf, header_lf)`` in the same form as :func:`read_pi_file`.
+    """
+    # ── 1. ヘッダー情報（スキーマメタデータから復元） ─────
+    schema = pq.read_schema(file_path)
+    metadata = schema.metadata or {}
+    if _PI_HEADER_KEY in metadata:
+        header_lf = pl.LazyFrame(
+            json.loads(metadata[_PI_HEADER_KEY]),
+            schema=_HEADER_SCHEMA,
+            orient="row",
+        )
+    else:
+        param_ids = [n for n in schema.names if n != "Datetime" and n not in PARTITION_SCHEMA.names]
+        header_lf = pl.LazyFrame(
+            {"param_id": param_ids, "param_name": param_ids, "unit": [None] * len(param_ids)},
+            schema=_HEADER_SCHEMA,
+        )
+
+    # ── 2. センサデータ本体（パーティション列は付け直す） ───
+    lf = (
+        pl.scan_parquet(file_path)
+        .drop(PARTITION_SCHEMA.names, strict=False)
+        .filter(pl.col("Datetime").is_not_null())
+        .with_columns([
+            pl.col("Datetime").dt.year().alias("year"),
+            pl.col("Datetime").dt.month().alias("month")
+        ])
     )
 
     return lf, header_lf
@@ -170,11 +367,17 @@ READERS: Dict[str, Callable[[Path, str], tuple[pl.LazyFrame, pl.LazyFrame]]] = {
     "pi": read_pi_file,
 }
 
+# Parquet 入力用の読込関数（CSV の解析を省略する）
+PARQUET_READERS: Dict[str, Callable[[Path, str], tuple[pl.LazyFrame, pl.LazyFrame]]] = {
+    "pi": read_pi_parquet,
+}
+
 
 def read_file_by_source(file_path: Path, data_source: str, encoding: str = "utf-8"):
-    """Dispatch file reading based on ``data_source``."""
+    """Dispatch file reading based on ``data_source`` and the file suffix."""
+    readers = PARQUET_READERS if file_path.suffix.lower() == ".parquet" else READERS
     try:
-        reader = READERS[data_source.lower()]
+        reader = readers[data_source.lower()]
     except KeyError:
         raise ValueError(f"Unsupported data source: {data_source}") from None
     return reader(file_path, encoding=encoding)
@@ -187,6 +390,8 @@ def register_header_to_duckdb(
     machine_no: str,
     data_source: str,
     table_name: str = "param_master",
+    *,
+    con: duckdb.DuckDBPyConnection | None = None,
 ):
     """Store parameter metadata into a DuckDB table.
 
@@ -205,19 +410,25 @@ def register_header_to_duckdb(
         Machine identifier used for partitioning.
     table_name : str, optional
         Name of the table used to store the metadata.
+    con : duckdb.DuckDBPyConnection | None, optional
+        Open connection to reuse. When omitted, a connection to ``db_path``
+        is opened and closed within the call.
     """
-    # フォルダ作成
-    db_path.parent.mkdir(parents=True, exist_ok=True)
-    
-    # DuckDBに接続
+    header_df = header_lf.collect()
+    with _connect(db_path, con) as con:
+        _register_header(header_df, con, plant_name, machine_no, data_source, table_name)
+        _register_param_ids(header_df, con, plant_name, machine_no, data_source, "parameter_id_master")
 
-    con = duckdb.connect(db_path)
-    # DataFrame化
-    header_df = header_lf.collect().to_pandas()
-    header_df["plant_name"] = plant_name
-    header_df["machine_no"] = machine_no
-    header_df["data_source"] = data_source
 
+def _register_header(
+    header_df: pl.DataFrame,
+    con: duckdb.DuckDBPyConnection,
+    plant_name: str,
+    machine_no: str,
+    data_source: str,
+    table_name: str,
+) -> None:
+    """Insert the rows of ``header_df`` missing from ``table_name``."""
     # テーブル作成（なければ）
     con.execute(
         f"""
@@ -233,32 +444,21 @@ def register_header_to_duckdb(
         """
     )
 
-    # 既存データ取得
-    existing_ids = set(
-        con.execute(
-            f"SELECT param_id FROM {table_name} WHERE plant_name = ? AND machine_no = ? AND data_source = ?",
-            [plant_name, machine_no, data_source],
-        ).fetchall()
-    )
-
-    # 未登録データ抽出
-    new_rows = header_df[~header_df["param_id"].isin([row[0] for row in existing_ids])]
-
-    # 追記
-    if not new_rows.empty:
-        con.executemany(
-            f"INSERT INTO {table_name} VALUES (?, ?, ?, ?, ?, ?)",
-            new_rows[["param_id", "param_name", "unit", "plant_name", "machine_no", "data_source"]].values.tolist(),
+    # Arrow のまま登録し、未登録の param_id だけを一括で追記
+    con.register("header_arrow", header_df.to_arrow())
+    con.execute(
+        f"""
+        INSERT INTO {table_name}
+        SELECT param_id, param_name, unit, ?, ?, ?
+        FROM header_arrow
+        WHERE param_id NOT IN (
+            SELECT param_id FROM {table_name}
+            WHERE plant_name = ? AND machine_no = ? AND data_source = ?
         )
-    con.close()
-
-    register_param_id_master(
-        header_lf,
-        db_path,
-        plant_name,
-        machine_no,
-        data_source,
+        """,
+        [plant_name, machine_no, data_source] * 2,
     )
+    con.unregister("header_arrow")
 
 
 def register_param_id_master(
@@ -268,6 +468,8 @@ def register_param_id_master(
     machine_no: str,
     data_source: str,
     table_name: str = "parameter_id_master",
+    *,
+    con: duckdb.DuckDBPyConnection | None = None,
 ) -> None:
     """Store param_id mapping information into a DuckDB table.
 
@@ -289,21 +491,23 @@ def register_param_id_master(
         Identifier for the data format.
     table_name : str, optional
         Name of the table used to store the mapping.
+    con : duckdb.DuckDBPyConnection | None, optional
+        Open connection to reuse. When omitted, a connection to ``db_path``
+        is opened and closed within the call.
     """
-    db_path.parent.mkdir(parents=True, exist_ok=True)
-
-    con = duckdb.connect(db_path)
-
-    header_df = header_lf.collect().to_pandas()
-    header_df["plant_name"] = plant_name
-    header_df["machine_no"] = machine_no
-    header_df["data_source"] = data_source
-    header_df["insert_date"] = datetime.now()
-    # 初期登録時は英語・日本語ともに CSV の param_name を流用する
-    header_df["param_name_en"] = header_df["param_name"]
-    header_df["param_name_ja"] = header_df["param_name"]
+    with _connect(db_path, con) as con:
+        _register_param_ids(header_lf.collect(), con, plant_name, machine_no, data_source, table_name)
 
 
+def _register_param_ids(
+    header_df: pl.DataFrame,
+    con: duckdb.DuckDBPyConnection,
+    plant_name: str,
+    machine_no: str,
+    data_source: str,
+    table_name: str,
+) -> None:
+    """Insert the ``param_id`` values of ``header_df`` missing from ``table_name``."""
     con.execute(
         f"""
         CREATE TABLE IF NOT EXISTS {table_name} (
@@ -319,31 +523,21 @@ def register_param_id_master(
         """
     )
 
-    existing_ids = set(
-        con.execute(
-            f"SELECT param_id FROM {table_name} WHERE plant_name = ? AND machine_no = ? AND data_source = ?",
-            [plant_name, machine_no, data_source],
-        ).fetchall()
-    )
-
-    new_rows = header_df[~header_df["param_id"].isin([row[0] for row in existing_ids])]
-
-    if not new_rows.empty:
-        con.executemany(
-            f"INSERT INTO {table_name} VALUES (?, ?, ?, ?, ?, ?, ?)",
-            new_rows[
-                [
-                    "param_id",
-                    "param_name_en",
-                    "param_name_ja",
-                    "plant_name",
-                    "machine_no",
-                    "data_source",
-                    "insert_date",
-                ]
-            ].values.tolist(),
+    # 初期登録時は英語・日本語ともに CSV の param_name を流用する
+    con.register("header_arrow", header_df.to_arrow())
+    con.execute(
+        f"""
+        INSERT INTO {table_name}
+        SELECT param_id, param_name, param_name, ?, ?, ?, ?
+        FROM header_arrow
+        WHERE param_id NOT IN (
+            SELECT param_id FROM {table_name}
+            WHERE plant_name = ? AND machine_no = ? AND data_source = ?
         )
-    con.close()
+        """,
+        [plant_name, machine_no, data_source, datetime.now(), plant_name, machine_no, data_source],
+    )
+    con.unregister("header_arrow")
 
 
 def write_parquet_file(
@@ -353,10 +547,16 @@ def write_parquet_file(
     machine_no: str,
     *,
     add_date_columns: bool = False,
+    basename_template: str = "part-{i}.parquet",
+    precision: Literal["f32", "f64"] = "f64",
+    header_lf: pl.LazyFrame | None = None,
 ) -> tuple[int, int]:
 
     """Write ``lf`` to ``parquet_path`` partitioned by plant/machine and date.
 
+    Rows are sorted by ``Datetime`` so that the row-group statistics of each
+    file cover narrow time ranges.
+
     Parameters
     ----------
     lf:
@@ -370,6 +570,17 @@ def write_parquet_file(
         When ``True`` ``year`` and ``month`` columns are derived from the
         ``Datetime`` column before writing.  This should be disabled if these
         columns were already added upstream.
+    basename_template:
+        File name template inside each partition directory. ``{i}`` is
+        replaced by a sequence number. Existing files with the same name are
+        overwritten.
+    precision:
+        Float type of the numeric columns other than ``year`` and ``month``.
+        ``"f32"`` halves their size in memory and on disk.
+    header_lf:
+        Parameter header from the reader. When given it is stored in the
+        ``pi_header`` schema metadata of each file so that the file can be
+        ingested again with :func:`read_pi_parquet`.
     Returns
     -------
 
@@ -378,50 +589,144 @@ def write_parquet_file(
         written to the Parquet dataset.
 
     """
+    row_count, column_count, written = _write_partitions(
+        lf,
+        parquet_path,
+        plant_name,
+        machine_no,
+        add_date_columns=add_date_columns,
+        basename_template=basename_template,
+        precision=precision,
+        header=header_lf.collect() if header_lf is not None else None,
+    )
+    # 読込側がディレクトリを走査せずに済むようマニフェストへ記録
+    update_manifest(parquet_path, written)
 
-    if add_date_columns:
-        lf = lf.with_columns(
-            [
-                pl.col("Datetime").dt.year().alias("year"),
-                pl.col("Datetime").dt.month().alias("month"),
-            ]
-        )
+    return row_count, column_count
 
-    lf = lf.with_columns(
-        [
-            pl.lit(plant_name).alias("plant_name"),
-            pl.lit(machine_no).alias("machine_no"),
-        ]
-    )
 
-    lf = (
-        lf
-        # year / month を除く数値列を Float64 に統一
-        .with_columns(
-            cs.numeric()                # ① すべての数値列
-            .exclude(["year", "month"]) # ② 除外したい列
-            .cast(pl.Float64)           # ③ キャスト
+def _null_count(metadata: pq.FileMetaData, path: Path, name: str) -> int:
+    """Return the number of nulls in column ``name`` of the Parquet file ``path``.
+
+    The row-group statistics are used when every row group has them, so that
+    the column does not have to be read.
+    """
+    index = metadata.schema.names.index(name)
+    stats = [metadata.row_group(i).column(index).statistics for i in range(metadata.num_row_groups)]
+    if all(st is not None and st.has_null_count for st in stats):
+        return sum(st.null_count for st in stats)
+    return pq.read_table(path, columns=[name]).column(0).null_count
+
+
+def _write_partitions(
+    lf: pl.LazyFrame,
+    parquet_path: Path,
+    plant_name: str,
+    machine_no: str,
+    *,
+    add_date_columns: bool,
+    basename_template: str,
+    precision: Literal["f32", "f64"] = "f64",
+    header: pl.DataFrame | None = None,
+    source: str = "data",
+) -> tuple[int, int, list[str]]:
+    """Write the partitioned Parquet files for :func:`write_parquet_file`.
+
+    Returns the row and column counts together with the paths written, so
+    that the caller can record them in the manifest. Rows with a null
+    ``Datetime`` cannot be assigned to a partition; they are dropped with a
+    warning naming ``source``, and :class:`ValueError` is raised when no
+    other row is left.
+    """
+
+    # 列の追加と型の統一は一つの with_columns にまとめる
+    exprs: list[pl.Expr] = []
+    if add_date_columns:
+        exprs += [
+            pl.col("Datetime").dt.year().alias("year"),
+            pl.col("Datetime").dt.month().alias("month"),
+        ]
+    exprs += [
+        # year / month を除く数値列を precision の浮動小数型に統一
+        cs.numeric()                     # ① すべての数値列
+        .exclude(["year", "month"])      # ② 除外したい列
+        .cast(_FLOAT_DTYPES[precision]), # ③ キャスト
+    ]
+    # Datetime 順に並べ、行グループごとの最小値・最大値の範囲を狭くする
+    lf = lf.with_columns(exprs).sort("Datetime")
+
+    # 全件をメモリに載せないよう、ストリーミングで一時 Parquet に書き出してから
+    # パーティションごとのファイルへバッチ単位で書き込む。
+    # 一時ファイルは出力と同じボリュームに置き、"_" 始まりのディレクトリで探索対象から外す
+    parquet_path.mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryDirectory(dir=parquet_path, prefix="_staging_") as tmp_dir:
+        staged_path = Path(tmp_dir) / "staged.parquet"
+        lf.sink_parquet(staged_path)
+
+        metadata = pq.read_metadata(staged_path)
+        row_count = metadata.num_rows
+        column_count = metadata.num_columns
+
+        # 日時を解釈できなかった行はフッターの統計から数え、黙って消さずに報告する
+        invalid = _null_count(metadata, staged_path, "Datetime")
+        if invalid and invalid == row_count:
+            raise ValueError(f"{source}: none of the {row_count} rows has a valid Datetime")
+        if invalid:
+            logger.warning(
+                "%s: dropped %d of %d rows whose Datetime could not be parsed",
+                source, invalid, row_count,
+            )
+            row_count -= invalid
+
+        staged = ds.dataset(staged_path, format="parquet")
+        if header is not None:
+            # ヘッダー情報をスキーマメタデータとして各ファイルに保存
+            staged = staged.replace_schema(staged.schema.with_metadata(
+                (staged.schema.metadata or {}) | {_PI_HEADER_KEY: json.dumps(header.rows())}
+            ))
+        data = staged.scanner(filter=ds.field("Datetime").is_valid()) if invalid else staged
+
+        written: list[str] = []
+        ds.write_dataset(
+            data=data,
+            # plant / machine は列として持たせず、出力先ディレクトリで表現する
+            base_dir=parquet_path / plant_name / machine_no,
+            format=_PARQUET_FORMAT,
+            file_options=_PARQUET_WRITE_OPTIONS,
+            # 上限だけでは入力バッチごとに行グループが切られるため、下限も同じ値にして
+            # 小さなバッチをまとめる
+            min_rows_per_group=_ROWS_PER_GROUP,
+            max_rows_per_group=_ROWS_PER_GROUP,
+            max_rows_per_file=_MAX_ROWS_PER_FILE,
+            partitioning=["year", "month"],
+            basename_template=basename_template,
+            existing_data_behavior="overwrite_or_ignore",
+            create_dir=True,
+            file_visitor=lambda f: written.append(f.path),
         )
-    )
 
-    df = lf.collect()
+    return row_count, column_count, written
 
-    row_count = df.height
-    column_count = df.width
 
-    tbl = df.to_arrow()
 
-    ds.write_dataset(
-        data=tbl,
-        base_dir=parquet_path,
-        format="parquet",
-        partitioning=["plant_name", "machine_no", "year", "month"],
-        existing_data_behavior="overwrite_or_ignore",
-        create_dir=True,
-    )
+@contextmanager
+def _connect(db_path: Path, con: duckdb.DuckDBPyConnection | None = None):
+    """Yield ``con``, or a new connection to ``db_path`` closed on exit."""
+    if con is not None:
+        yield con
+        return
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    with duckdb.connect(db_path) as new_con:
+        yield new_con
 
-    return row_count, column_count
 
+def file_mtime(file_path: Path) -> datetime:
+    """Return the modification time recorded in the processed history.
+
+    Callers stat each file once with this function and pass the result to
+    :func:`is_processed` and :func:`mark_processed`.
+    """
+    return datetime.fromtimestamp(file_path.stat().st_mtime)
 
 
 def _ensure_processed_table(con: duckdb.DuckDBPyConnection, table_name: str) -> None:
@@ -456,6 +761,9 @@ def is_processed(
     machine_no: str,
     data_source: str,
     table_name: str = "processed_files",
+    *,
+    mtime: datetime | None = None,
+    con: duckdb.DuckDBPyConnection | None = None,
 ) -> bool:
     """Check whether a file has already been processed.
 
@@ -477,15 +785,21 @@ def is_processed(
         Identifier for the data format.
     table_name : str, optional
         Name of the table which records processed files.
+    mtime : datetime | None, optional
+        Modification time of ``file_path`` when already known. The file is
+        only stat'ed when omitted.
+    con : duckdb.DuckDBPyConnection | None, optional
+        Open connection to reuse. When omitted, a connection to ``db_path``
+        is opened and closed within the call.
 
     Returns
     -------
     bool
         ``True`` when a record for ``file_path`` exists.
     """
-    db_path.parent.mkdir(parents=True, exist_ok=True)
-    mtime = datetime.fromtimestamp(file_path.stat().st_mtime)
-    with duckdb.connect(db_path) as con:
+    if mtime is None:
+        mtime = file_mtime(file_path)
+    with _connect(db_path, con) as con:
         _ensure_processed_table(con, table_name)
         result = con.execute(
             f"SELECT 1 FROM {table_name} WHERE file_name = ? AND file_mtime = ? AND plant_name = ? AND machine_no = ? AND data_source = ?",
@@ -501,6 +815,9 @@ def mark_processed(
     machine_no: str,
     data_source: str,
     table_name: str = "processed_files",
+    *,
+    mtime: datetime | None = None,
+    con: duckdb.DuckDBPyConnection | None = None,
 ) -> None:
     """Record that a file has been processed.
 
@@ -521,17 +838,239 @@ def mark_processed(
         Identifier for the data format.
     table_name : str, optional
         Name of the table used to store the history.
+    mtime : datetime | None, optional
+        Modification time of ``file_path`` when already known. The file is
+        only stat'ed when omitted.
+    con : duckdb.DuckDBPyConnection | None, optional
+        Open connection to reuse. When omitted, a connection to ``db_path``
+        is opened and closed within the call.
     """
-    db_path.parent.mkdir(parents=True, exist_ok=True)
-    with duckdb.connect(db_path) as con:
+    if mtime is None:
+        mtime = file_mtime(file_path)
+    with _connect(db_path, con) as con:
         _ensure_processed_table(con, table_name)
-        mtime = datetime.fromtimestamp(file_path.stat().st_mtime)
         con.execute(
             f"INSERT OR REPLACE INTO {table_name} VALUES (?, ?, ?, ?, ?, ?)",
             [file_path.name, mtime, plant_name, machine_no, data_source, datetime.now()],
         )
 
 
+def load_processed_set(
+    db_path: Path,
+    plant_name: str,
+    machine_no: str,
+    data_source: str,
+    table_name: str = "processed_files",
+    *,
+    con: duckdb.DuckDBPyConnection | None = None,
+) -> set[tuple[str, datetime]]:
+    """Return the processed ``(file_name, file_mtime)`` pairs in one query.
+
+    :func:`process_csv_files` checks membership in this set instead of
+    calling :func:`is_processed` for every file.
+
+    Parameters
+    ----------
+    db_path : Path
+        DuckDB database storing the history table.
+    plant_name : str
+        Plant identifier used for partitioning.
+    machine_no : str
+        Machine identifier used for partitioning.
+    data_source : str
+        Identifier for the data format.
+    table_name : str, optional
+        Name of the table which records processed files.
+    con : duckdb.DuckDBPyConnection | None, optional
+        Open connection to reuse. When omitted, a connection to ``db_path``
+        is opened and closed within the call.
+    """
+    with _connect(db_path, con) as con:
+        _ensure_processed_table(con, table_name)
+        rows = con.execute(
+            f"SELECT file_name, file_mtime FROM {table_name} WHERE plant_name = ? AND machine_no = ? AND data_source = ?",
+            [plant_name, machine_no, data_source],
+        ).fetchall()
+    return set(rows)
+
+
+def mark_processed_many(
+    entries: list[tuple[Path, datetime]],
+    db_path: Path,
+    plant_name: str,
+    machine_no: str,
+    data_source: str,
+    table_name: str = "processed_files",
+    *,
+    con: duckdb.DuckDBPyConnection | None = None,
+) -> None:
+    """Record several processed files in a single statement.
+
+    Parameters
+    ----------
+    entries : list[tuple[Path, datetime]]
+        Processed files with the modification time observed before
+        processing.
+    db_path : Path
+        DuckDB database storing the history table.
+    plant_name : str
+        Plant identifier used for partitioning.
+    machine_no : str
+        Machine identifier used for partitioning.
+    data_source : str
+        Identifier for the data format.
+    table_name : str, optional
+        Name of the table used to store the history.
+    con : duckdb.DuckDBPyConnection | None, optional
+        Open connection to reuse. When omitted, a connection to ``db_path``
+        is opened and closed within the call.
+    """
+    if not entries:
+        return
+    batch = pa.table({
+        "file_name": [fp.name for fp, _ in entries],
+        "file_mtime": [mtime for _, mtime in entries],
+    })
+    with _connect(db_path, con) as con:
+        _ensure_processed_table(con, table_name)
+        con.register("processed_batch", batch)
+        con.execute(
+            f"""
+            INSERT OR REPLACE INTO {table_name}
+            SELECT file_name, file_mtime, ?, ?, ?, ? FROM processed_batch
+            """,
+            [plant_name, machine_no, data_source, datetime.now()],
+        )
+        con.unregister("processed_batch")
+
+
+def _convert_file(
+    file_path: Path,
+    basename: str,
+    data_source: str,
+    parquet_path: Path,
+    plant_name: str,
+    machine_no: str,
+    precision: Literal["f32", "f64"] = "f64",
+) -> tuple[pl.DataFrame, int, int, list[str]]:
+    """Convert one file to Parquet inside a worker of :func:`process_csv_files`.
+
+    DuckDB and the manifest are left to the calling process so that they
+    have a single writer. Output files are named after ``basename`` so that
+    workers never write to the same file and reprocessing a file replaces
+    its previous output.
+
+    Returns
+    -------
+    tuple[pl.DataFrame, int, int, list[str]]
+        ``(header_df, row_count, column_count, written)``.
+    """
+    lf, header_lf = read_file_by_source(file_path, data_source)
+    header_df = header_lf.collect()
+    row_count, column_count, written = _write_partitions(
+        lf,
+        parquet_path,
+        plant_name,
+        machine_no,
+        add_date_columns=False,
+        basename_template=f"{basename}-{{i}}.parquet",
+        precision=precision,
+        header=header_df,
+        source=str(file_path),
+    )
+    return header_df, row_count, column_count, written
+
+
+def _output_basename(file_path: Path) -> str:
+    """Return the output file name prefix for ``file_path``.
+
+    The prefix combines the file stem with a short hash of the resolved
+    path, so files sharing a stem (e.g. same-named ZIP members) never write
+    to the same Parquet file, and reprocessing a file always replaces its
+    own previous output regardless of which other files are processed.
+    """
+    digest = hashlib.blake2s(str(file_path.resolve()).encode(), digest_size=4).hexdigest()
+    return f"{file_path.stem}_{digest}"
+
+
+# ワーカープロセスのスレッド数を決める環境変数（Polars と Arrow の CPU スレッドプール）
+_THREAD_ENV_VARS = ("POLARS_MAX_THREADS", "OMP_NUM_THREADS")
+
+
+@contextmanager
+def _worker_thread_limit(n_threads: int):
+    """Limit the thread pools of worker processes started inside the block.
+
+    Spawned workers copy the environment when they start, so the limit is
+    set in ``os.environ`` for the duration of the block and then restored.
+    Variables already set by the user are left untouched.
+    """
+    added = [name for name in _THREAD_ENV_VARS if name not in os.environ]
+    for name in added:
+        os.environ[name] = str(n_threads)
+    try:
+        yield
+    finally:
+        for name in added:
+            os.environ.pop(name, None)
+
+
+def _convert_files(
+    file_paths: list[Path],
+    data_source: str,
+    parquet_path: Path,
+    plant_name: str,
+    machine_no: str,
+    max_workers: int | None,
+    precision: Literal["f32", "f64"] = "f64",
+):
+    """Yield ``(file_path, result)`` of :func:`_convert_file` as files finish.
+
+    When the caller stops early or a conversion fails, conversions that
+    have not started are cancelled. Output of conversions that were already
+    running is recorded in the manifest so that no Parquet file is left
+    outside it.
+    """
+    basenames = [_output_basename(fp) for fp in file_paths]
+
+    args = (data_source, parquet_path, plant_name, machine_no, precision)
+    if max_workers == 1 or len(file_paths) == 1:
+        for fp, name in zip(file_paths, basenames):
+            yield fp, _convert_file(fp, name, *args)
+        return
+
+    # Polars のスレッドプールは fork と相性が悪いため spawn でワーカーを起動
+    cpu_count = os.cpu_count() or 1
+    n_workers = min(max_workers or cpu_count, len(file_paths))
+    pool = ProcessPoolExecutor(
+        max_workers=n_workers,
+        mp_context=multiprocessing.get_context("spawn"),
+    )
+    # 各ワーカーが全コア分のスレッドを持つと過剰になるため、コアをワーカー間で分ける。
+    # ワーカーは submit 時に起動されるので、投入が終わるまで制限を設定しておく
+    with _worker_thread_limit(max(1, cpu_count // n_workers)):
+        futures = {
+            pool.submit(_convert_file, fp, name, *args): fp
+            for fp, name in zip(file_paths, basenames)
+        }
+    pending = set(futures)
+    try:
+        for future in as_completed(futures):
+            pending.discard(future)
+            yield futures[future], future.result()
+    finally:
+        # 未着手の変換は取り消し、実行中だった変換の出力はマニフェストへ記録する
+        pool.shutdown(wait=True, cancel_futures=True)
+        written = [
+            path
+            for future in pending
+            if not future.cancelled() and future.exception() is None
+            for path in future.result()[3]
+        ]
+        if written:
+            update_manifest(parquet_path, written)
+
+
 def process_csv_files(
     file_paths: list[Path],
     parquet_path: Path,
@@ -541,13 +1080,24 @@ def process_csv_files(
     data_source: str,
     *,
     force: bool = False,
+    max_workers: int | None = None,
+    precision: Literal["f32", "f64"] = "f64",
 ) -> None:
     """Process CSV files, store them as Parquet and update history.
 
+    Files are parsed and written to Parquet in parallel worker processes.
+    The DuckDB tables and the manifest are updated from this process as each
+    file finishes.
+
+    Workers are started with the ``spawn`` method, which imports the
+    calling script's main module in each worker. A script calling this
+    function with ``max_workers`` other than ``1`` must therefore guard its
+    entry point with ``if __name__ == "__main__":``.
+
     Parameters
     ----------
     file_paths : list[Path]
-        CSV files to process.
+        CSV (or Parquet) files to process.
     parquet_path : Path
         Root directory of the output Parquet dataset.
     plant_name : str
@@ -560,20 +1110,68 @@ def process_csv_files(
         Identifier for the data format.
     force : bool, optional
         If ``True``, process files even when they are already recorded.
+    max_workers : int | None, optional
+        Number of worker processes. Defaults to the number of CPUs; ``1``
+        processes the files in the current process. The CPUs are divided
+        between the workers' Polars and Arrow thread pools.
+    precision : {"f32", "f64"}, optional
+        Float type of the numeric sensor columns written to Parquet.
     """
-    for fp in file_paths:
-        if not force and is_processed(fp, db_path, plant_name, machine_no, data_source):
-            print(f"skip {fp} (already processed)")
+    # DuckDB への接続は処理全体で一度だけ開く
+    with _connect(db_path) as con:
+        _process_csv_files(
+            file_paths, parquet_path, plant_name, machine_no, db_path, data_source,
+            con=con, force=force, max_workers=max_workers, precision=precision,
+        )
+
+
+def _process_csv_files(
+    file_paths: list[Path],
+    parquet_path: Path,
+    plant_name: str,
+    machine_no: str,
+    db_path: Path,
+    data_source: str,
+    *,
+    con: duckdb.DuckDBPyConnection,
+    force: bool,
+    max_workers: int | None,
+    precision: Literal["f32", "f64"],
+) -> None:
+    """Body of :func:`process_csv_files` using the open connection ``con``."""
+    # 処理済み履歴は最初に一度だけ取得し、以降はメモリ上で判定する
+    processed = set() if force else load_processed_set(db_path, plant_name, machine_no, data_source, con=con)
+
+    targets = []
+    mtimes: dict[Path, datetime] = {}
+    # 同じファイルを複数のワーカーで同時に書き込まないよう重複を除く
+    for fp in dict.fromkeys(file_paths):
+        mtime = file_mtime(fp)
+        if (fp.name, mtime) in processed:
+            logger.info("skip %s (already processed)", fp)
             continue
-        print(f"processing {fp}")
-        lf, header_lf = read_file_by_source(fp, data_source)
-        register_header_to_duckdb(header_lf, db_path, plant_name, machine_no, data_source)
+        logger.info("processing %s", fp)
+        targets.append(fp)
+        mtimes[fp] = mtime
+    if not targets:
+        return
 
-        row_count, column_count = write_parquet_file(
-            lf, parquet_path, plant_name, machine_no
+    done: list[tuple[Path, datetime]] = []
+    try:
+        results = _convert_files(
+            targets, data_source, parquet_path, plant_name, machine_no, max_workers, precision
         )
-        mark_processed(fp, db_path, plant_name, machine_no, data_source)
-        print(f"processed {fp}: {row_count} rows, {column_count} columns")
+        # 途中で失敗した場合も、未着手の変換を取り消すため生成器を確実に閉じる
+        with closing(results):
+            for fp, (header_df, row_count, column_count, written) in results:
+                # 書き込んだファイルは先にマニフェストへ記録する（登録で失敗しても再処理で置き換わる）
+                update_manifest(parquet_path, written)
+                register_header_to_duckdb(header_df.lazy(), db_path, plant_name, machine_no, data_source, con=con)
+                done.append((fp, mtimes[fp]))
+                logger.info("processed %s: %d rows, %d columns", fp, row_count, column_count)
+    finally:
+        # 途中で失敗しても完了済みのファイルは履歴に残す
+        mark_processed_many(done, db_path, plant_name, machine_no, data_source, con=con)
 
 
 def process_targets(
@@ -586,13 +1184,15 @@ def process_targets(
     *,
     file_name_pattern: list[str] | None = None,
     force: bool = False,
+    max_workers: int | None = None,
+    precision: Literal["f32", "f64"] = "f64",
 ) -> None:
     """Entry point to process user-specified targets.
 
     Parameters
     ----------
     targets : list[Path]
-        Directories or files (CSV/ZIP) to search.
+        Directories or files (CSV/ZIP/Parquet) to search.
     parquet_path, plant_name, machine_no, db_path : Path/str
         Parameters forwarded to :func:`process_csv_files`.
     data_source : str
@@ -601,11 +1201,17 @@ def process_targets(
         Patterns used to filter file names.
     force : bool, optional
         When ``True`` reprocess files even if they were already handled.
+    max_workers : int | None, optional
+        Number of worker processes forwarded to :func:`process_csv_files`.
+        Unless it is ``1``, the calling script needs an
+        ``if __name__ == "__main__":`` guard.
+    precision : {"f32", "f64"}, optional
+        Float type of the sensor columns forwarded to :func:`process_csv_files`.
     """
 
     csv_files = collect_csv_files(targets, file_name_pattern)
     if not csv_files:
-        print("No files to process")
+        logger.info("No files to process")
         return
     process_csv_files(
         csv_files,
@@ -615,4 +1221,6 @@ def process_targets(
         db_path,
         data_source,
         force=force,
+        max_workers=max_workers,
+        precision=precision,
     )
@@ -1,11 +1,228 @@
+import logging
+import operator
+import os
 import polars as pl
+from functools import lru_cache, reduce
 from pathlib import Path
+import pyarrow.compute as pc
 import pyarrow.dataset as ds
 import pyarrow as pa
+import pyarrow.parquet as pq
 from datetime import datetime
+from zoneinfo import ZoneInfo
 
-def _to_dt(ts):  # str → datetime 変換ユーティリティ
-    return ts if isinstance(ts, datetime) else datetime.fromisoformat(ts)
+from libs.manifest import PARTITION_SCHEMA, manifest_signature, read_manifest
+
+logger = logging.getLogger(__name__)
+
+def _to_dt(ts, tz: str | None = None):  # str → datetime 変換ユーティリティ
+    dt = ts if isinstance(ts, datetime) else datetime.fromisoformat(ts)
+    if tz:
+        # 列がタイムゾーン付きの場合は同じタイムゾーンにそろえる（naive は現地時刻とみなす）
+        zone = datetime.strptime(tz, "%z").tzinfo if tz[0] in "+-" else ZoneInfo(tz)
+        dt = dt.replace(tzinfo=zone) if dt.tzinfo is None else dt.astimezone(zone)
+    return dt
+
+def _all(parts: list):  # 条件式の連結（条件がなければ None）
+    return reduce(operator.and_, parts) if parts else None
+
+# plant 配下のパーティション構成（machine_no / year / month）
+_PLANT_PART_SCHEMA = pa.schema([f for f in PARTITION_SCHEMA if f.name != "plant_name"])
+_PLANT_PARTITIONING = ds.partitioning(_PLANT_PART_SCHEMA)
+
+# (year, month) を列挙してフィルタする最大月数。超える場合は範囲条件を使う
+_MAX_PARTITION_LIST = 24
+
+def _month_range(first: tuple[int, int], last: tuple[int, int]) -> list[tuple[int, int]]:
+    """Return the ``(year, month)`` pairs from ``first`` to ``last`` inclusive."""
+    months = []
+    y, m = first
+    while (y, m) <= last:
+        months.append((y, m))
+        y, m = (y + 1, 1) if m == 12 else (y, m + 1)
+    return months
+
+def _tree_signature(path: str) -> int:
+    """Return the latest modification time (ns) of the directories under ``path``.
+
+    Adding or removing a file changes the mtime of its directory, and a file
+    rewritten in place keeps its path, so only directories are stat'ed
+    rather than every Parquet file.
+    """
+    latest = os.stat(path).st_mtime_ns
+    stack = [path]
+    while stack:
+        with os.scandir(stack.pop()) as it:
+            for entry in it:
+                if entry.is_dir():
+                    latest = max(latest, entry.stat().st_mtime_ns)
+                    stack.append(entry.path)
+    return latest
+
+@lru_cache(maxsize=256)
+def _partition_filter(
+    machine_no: str | None,
+    first: tuple[int, int] | None,
+    last: tuple[int, int] | None,
+) -> ds.Expression | None:
+    """Build the Arrow expression selecting the partitions to read.
+
+    ``first`` and ``last`` are the ``(year, month)`` of the start and end
+    bounds. The expression depends on nothing else, so it is cached and
+    reused by every query over the same months. ``None`` is returned when
+    no partition needs to be excluded.
+    """
+    parts = []
+    if machine_no:
+        parts.append(ds.field("machine_no") == machine_no)
+    months = _month_range(first, last) if first and last else None
+    if months is not None and len(months) <= _MAX_PARTITION_LIST:
+        # 対象の (year, month) を列挙し、パーティション単位で絞り込む
+        parts.append(reduce(
+            operator.or_,
+            [(ds.field("year") == y) & (ds.field("month") == m) for y, m in months],
+            ds.scalar(False),
+        ))
+    else:
+        if first:
+            parts.append((ds.field("year") > first[0]) | (
+                         (ds.field("year") == first[0]) & (ds.field("month") >= first[1])))
+        if last:
+            parts.append((ds.field("year") < last[0]) | (
+                         (ds.field("year") == last[0]) & (ds.field("month") <= last[1])))
+    return _all(parts)
+
+@lru_cache(maxsize=32)
+def _dataset_catalog(path: str, signature: int) -> tuple[pa.Schema, pa.Table]:
+    """Discover the fragments under ``path`` with PyArrow.
+
+    Returns the dataset schema and a table listing each file with its
+    partition values. ``signature`` (see :func:`_tree_signature`) is only
+    used as part of the cache key so that the catalog is rebuilt once files
+    are added or removed.
+    """
+    dataset = ds.dataset(
+        path,
+        format="parquet",
+        partitioning=_PLANT_PARTITIONING,
+    )
+    fragments = list(dataset.get_fragments())
+    keys = [ds.get_partition_keys(f.partition_expression) for f in fragments]
+    files = pa.table(
+        {"path": pa.array([f.path for f in fragments], pa.string())}
+        | {
+            field.name: pa.array([k.get(field.name) for k in keys], field.type)
+            for field in _PLANT_PART_SCHEMA
+        }
+    )
+    return dataset.schema, files
+
+@lru_cache(maxsize=32)
+def _file_schema(path: str, mtime_ns: int) -> pa.Schema:
+    return pq.read_schema(path)
+
+def _manifest_catalog(root: str, plant_name: str) -> tuple[pa.Schema, pa.Table] | None:
+    """Look up the fragments of ``plant_name`` in the writer's manifest.
+
+    ``None`` is returned when there is no manifest or none of its entries
+    for the plant exists anymore, in which case the directory has to be
+    discovered instead.
+    """
+    signature = manifest_signature(root)
+    if signature is None:
+        return None
+    return _build_manifest_catalog(root, plant_name, signature)
+
+@lru_cache(maxsize=32)
+def _build_manifest_catalog(
+    root: str, plant_name: str, signature: tuple[int, int]
+) -> tuple[pa.Schema, pa.Table] | None:
+    """Build the catalog of :func:`_manifest_catalog`.
+
+    ``signature`` (see :func:`manifest_signature`) is only used as part of
+    the cache key so that the catalog is rebuilt once the manifest is
+    updated. Entries may point to deleted files; :func:`load_dataset`
+    drops them when a scan fails.
+    """
+    manifest = read_manifest(root)
+    if manifest is None:
+        return None
+    entries = manifest.filter(ds.field("plant_name") == plant_name)
+    # スキーマは先頭から順に見て、存在する最初のファイルから取得する
+    for entry in entries.select(["path", "mtime_ns"]).to_pylist():
+        try:
+            schema = _file_schema(os.path.join(root, entry["path"]), entry["mtime_ns"])
+            break
+        except FileNotFoundError:
+            continue
+    else:
+        return None
+    schema = pa.schema([f for f in schema if f.name not in PARTITION_SCHEMA.names] + list(_PLANT_PART_SCHEMA))
+    paths = pc.binary_join_element_wise(root, entries["path"], "/")
+    files = pa.table(
+        {"path": paths.cast(pa.string())}
+        | {name: entries[name] for name in _PLANT_PART_SCHEMA.names}
+    )
+    return schema, files
+
+def _drop_missing(files: pa.Table) -> pa.Table:
+    """Remove the rows of ``files`` whose file no longer exists."""
+    exists = [os.path.exists(p) for p in files["path"].to_pylist()]
+    return files.filter(pa.array(exists, pa.bool_()))
+
+# 読込時に付与するファイルパス列（パーティション値の対応付けにのみ使う）
+_PATH_COLUMN = "__fragment_path"
+
+def _scan_fragments(schema: pa.Schema, files: pa.Table) -> pl.LazyFrame:
+    """Scan ``files`` with a single multi-file Polars Parquet scan.
+
+    Partition values are encoded in the directory layout rather than in the
+    files, so they are attached by joining ``files`` on the source path of
+    each row. When only one file matches, they are added as literals
+    instead and no path column or join is needed. Columns follow
+    ``schema``: columns missing from a file are filled with nulls, columns
+    not in ``schema`` are ignored, and Float32 files are read as the
+    schema's float type.
+    """
+    if files.num_rows == 0:
+        return pl.from_arrow(schema.empty_table()).lazy()
+    part_names = files.column_names[1:]
+    file_schema = pl.from_arrow(schema.empty_table()).drop(part_names).schema
+    paths = files["path"].to_pylist()
+    options = dict(
+        schema=file_schema,
+        missing_columns="insert",
+        extra_columns="ignore",
+        cast_options=pl.ScanCastOptions(float_cast=["upcast", "downcast"]),
+        glob=False,
+    )
+    if len(paths) == 1:
+        # 1 ファイルだけの場合はパーティション値を定数列として付与する
+        part_dtypes = pl.from_arrow(schema.empty_table()).select(part_names).schema
+        return pl.scan_parquet(paths[0], **options).with_columns(
+            pl.lit(files[name][0].as_py(), dtype=part_dtypes[name]).alias(name)
+            for name in part_names
+        )
+    lf = pl.scan_parquet(paths, include_file_paths=_PATH_COLUMN, **options)
+    partitions = pl.from_arrow(files).rename({"path": _PATH_COLUMN}).lazy()
+    return lf.join(partitions, on=_PATH_COLUMN, how="left", maintain_order="left").drop(_PATH_COLUMN)
+
+def _collect(
+    schema: pa.Schema,
+    files: pa.Table,
+    selected_columns: list[str] | None,
+    cond: pl.Expr | None,
+) -> pl.DataFrame:
+    """Scan ``files`` and return the selected columns of the rows matching ``cond``."""
+    lf = _scan_fragments(schema, files)
+    if selected_columns:
+        # 選択されたカラムが存在する場合のみ選択し、フィルタより先に射影する
+        lf = lf.select(selected_columns)
+    if cond is not None:
+        lf = lf.filter(cond)
+
+    # ストリーミングエンジンでパーティションをバッチ単位に処理しメモリ使用量を抑える
+    return lf.collect(engine="streaming")
 
 def load_dataset(
     root: str | Path,
@@ -17,52 +234,50 @@ def load_dataset(
     selected_columns: list[str] | None = None,
 ) -> pl.DataFrame:
 
-    part_schema = pa.schema([
-        ("machine_no", pa.string()),
-        ("year",  pa.int16()),
-        ("month", pa.int8()),
-    ])
-
-    # 1) Arrow Dataset（Directory 形式）
-    dataset = ds.dataset(
-        root / plant_name,
-        format="parquet",
-        partitioning=ds.partitioning(part_schema),
-    )
+    # 1) 対象ファイルの一覧。書込側のマニフェストがあればディレクトリ走査を省略し、
+    #    なければ Arrow Dataset（Directory 形式）で探索する
+    root = os.fspath(root)
+    catalog = _manifest_catalog(root, plant_name)
+    if catalog is None:
+        plant_path = os.path.join(root, plant_name)
+        catalog = _dataset_catalog(plant_path, _tree_signature(plant_path))
+    schema, files = catalog
 
-    # 2) Lazy スキャン
-    lf = pl.scan_pyarrow_dataset(dataset)
+    # 境界値は Datetime 列と同じ型・タイムゾーンで比較し、行グループ統計での除外を効かせる
+    dt_type = schema.field("Datetime").type
+    dt_dtype = pl.Datetime(dt_type.unit, dt_type.tz)
+    sdt = _to_dt(start, dt_type.tz) if start else None
+    edt = _to_dt(end, dt_type.tz) if end else None
 
-    # 3) Polars 式でフィルタを組立（自動 push-down）
-    cond = pl.lit(True)
-    if machine_no:
-        cond &= pl.col("machine_no") == machine_no
-    if start:
-        sdt = _to_dt(start)
-        cond &= (pl.col("year") >  sdt.year - 1) & (
-                 (pl.col("year") >  sdt.year) |
-                 ((pl.col("year") == sdt.year) & (pl.col("month") >= sdt.month))
-        )
-        cond &= pl.col("Datetime") >= sdt          # 秒レベル
-    if end:
-        edt = _to_dt(end)
-        cond &= (pl.col("year") <  edt.year + 1) & (
-                 (pl.col("year") <  edt.year) |
-                 ((pl.col("year") == edt.year) & (pl.col("month") <= edt.month))
-        )
-        cond &= pl.col("Datetime") <= edt
+    # 2) パーティション条件で読み込むファイルを絞り込み、Polars で Lazy スキャン
+    part_cond = _partition_filter(
+        machine_no,
+        (sdt.year, sdt.month) if sdt else None,
+        (edt.year, edt.month) if edt else None,
+    )
+    if part_cond is not None:
+        files = files.filter(part_cond)
 
-    lf = lf.filter(cond)
+    # 3) Polars 式で Datetime のフィルタを組立（行グループ統計へ push-down）
+    parts = []
+    if sdt:
+        parts.append(pl.col("Datetime") >= pl.lit(sdt, dtype=dt_dtype))  # 秒レベル
+    if edt:
+        parts.append(pl.col("Datetime") <= pl.lit(edt, dtype=dt_dtype))
+    cond = _all(parts)
 
     if selected_columns:
         selected_columns = ["Datetime"] + selected_columns
         # カラムの存在有無確認して存在するカラムだけを選択、存在しないカラムはメッセージで表示
-        existing_columns = lf.collect_schema().names()
-        missing_columns = set(selected_columns) - set(existing_columns)
+        # スキーマは探索時に取得済みのものを使う（フッターの再読込を避ける）
+        existing_columns = set(schema.names)
+        missing_columns = set(selected_columns) - existing_columns
         if missing_columns:
-            print(f"Warning: The following columns are not found in the dataset: {missing_columns}")
-        # 選択されたカラムが存在する場合のみ選択
-        selected_columns = [col for col in selected_columns if col in existing_columns]        
-        lf = lf.select(selected_columns)
+            logger.warning("The following columns are not found in the dataset: %s", missing_columns)
+        selected_columns = [col for col in selected_columns if col in existing_columns]
 
-    return lf.collect()
\ No newline at end of file
+    try:
+        return _collect(schema, files, selected_columns, cond)
+    except FileNotFoundError:
+        # マニフェストに削除済みのファイルが残っていた場合は、存在するファイルだけで読み直す
+        return _collect(schema, _drop_missing(files), selected_columns, cond)
@@ -0,0 +1,150 @@
+import os
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import tempfile
+from contextlib import contextmanager
+from functools import lru_cache
+from pathlib import Path
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+# データセットのルートに置くマニフェスト（"_" 始まりなので Dataset の探索対象外）
+MANIFEST_NAME = "_manifest.arrow"
+# 更新を直列化するためのロックファイル
+_LOCK_NAME = MANIFEST_NAME + ".lock"
+
+# 出力データセットのパーティション構成（ディレクトリ形式: plant/machine/year/month）
+PARTITION_SCHEMA = pa.schema([
+    ("plant_name", pa.string()),
+    ("machine_no", pa.string()),
+    ("year", pa.int16()),
+    ("month", pa.int8()),
+])
+
+MANIFEST_SCHEMA = pa.schema([
+    ("path", pa.string()),          # ルートからの相対パス（POSIX 形式）
+    *PARTITION_SCHEMA,
+    ("mtime_ns", pa.int64()),
+])
+
+_PARTITIONING = ds.partitioning(PARTITION_SCHEMA)
+
+
+def _manifest_entries(root: Path, file_paths: list[str]) -> pa.Table:
+    """Build manifest rows for ``file_paths`` located under ``root``."""
+    rows: dict[str, list] = {name: [] for name in MANIFEST_SCHEMA.names}
+    for fp in file_paths:
+        rel = Path(fp).relative_to(root)
+        keys = ds.get_partition_keys(_PARTITIONING.parse(rel.as_posix()))
+        rows["path"].append(rel.as_posix())
+        for name in PARTITION_SCHEMA.names:
+            rows[name].append(keys.get(name))
+        rows["mtime_ns"].append(os.stat(fp).st_mtime_ns)
+    return pa.table(rows, schema=MANIFEST_SCHEMA)
+
+
+@contextmanager
+def _manifest_lock(root: Path):
+    """Hold an exclusive cross-process lock on the manifest under ``root``."""
+    with open(root / _LOCK_NAME, "a+b") as f:
+        if os.name == "nt":
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    # LK_LOCK は約 10 秒で諦めるので取れるまで再試行する
+                    continue
+        else:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if os.name == "nt":
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def _read_manifest_file(manifest_path: str) -> pa.Table:
+    with pa.OSFile(manifest_path) as source:
+        return pa.ipc.open_file(source).read_all()
+
+
+def update_manifest(root: Path, written: list[str]) -> None:
+    """Record ``written`` Parquet files in the manifest under ``root``.
+
+    When no manifest exists yet, every Parquet file already present under
+    ``root`` is registered so that the manifest always covers the whole
+    dataset. Concurrent updates from several processes are serialized with
+    a lock file next to the manifest.
+
+    Parameters
+    ----------
+    root : Path
+        Root directory of the partitioned Parquet dataset.
+    written : list[str]
+        Paths of the files written by :func:`pyarrow.dataset.write_dataset`.
+    """
+    manifest_path = root / MANIFEST_NAME
+    with _manifest_lock(root):
+        # ロック中は他プロセスの更新を取りこぼさないようキャッシュを通さずに読む
+        if manifest_path.exists():
+            current = _read_manifest_file(str(manifest_path))
+            new = _manifest_entries(root, written)
+            kept = current.filter(pc.invert(pc.is_in(current["path"], value_set=new["path"])))
+            entries = pa.concat_tables([kept, new])
+        else:
+            # 初回は既存ファイルを一度だけ走査して登録する（Dataset の探索と同じく
+            # "_" / "." 始まりの書込中の一時ディレクトリなどは除く）
+            entries = _manifest_entries(root, [
+                str(p) for p in root.rglob("*.parquet")
+                if not any(part.startswith(("_", ".")) for part in p.relative_to(root).parts)
+            ])
+        entries = entries.sort_by("path")
+
+        # 読み込み中のプロセスが壊れたファイルを見ないよう一時ファイルからの置き換えで更新する
+        fd, tmp_path = tempfile.mkstemp(dir=root, prefix="_manifest.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as sink, pa.ipc.new_file(sink, MANIFEST_SCHEMA) as writer:
+                writer.write_table(entries)
+            os.replace(tmp_path, manifest_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+
+@lru_cache(maxsize=8)
+def _load_manifest(manifest_path: str, signature: tuple[int, int]) -> pa.Table:
+    return _read_manifest_file(manifest_path)
+
+
+def manifest_signature(root: str | Path) -> tuple[int, int] | None:
+    """Return a key identifying the current manifest under ``root``.
+
+    The key is ``(mtime_ns, inode)``; every update replaces the file and
+    therefore changes its inode as well, even when the mtime resolution is
+    coarse. ``None`` is returned when there is no manifest.
+    """
+    try:
+        st = os.stat(os.path.join(root, MANIFEST_NAME))
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_ino
+
+
+def read_manifest(root: str | Path) -> pa.Table | None:
+    """Return the manifest table under ``root`` or ``None`` if it is missing.
+
+    The parsed manifest is cached until the file is replaced.
+    """
+    signature = manifest_signature(root)
+    if signature is None:
+        return None
+    return _load_manifest(os.path.join(root, MANIFEST_NAME), signature)
@@ -1,8 +1,10 @@
+import logging
 from pathlib import Path
 from libs.csv_to_db import process_targets
 
 
 if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
     targets = [Path("data")]
     parquet_path = Path("output")
     plant_name = "plant1"